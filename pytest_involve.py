@@ -6,20 +6,21 @@ into the following four regions with #region / #endRegion:
 
 * imports
 * pytest hooks -- Functions the pytest framework will call
-* data structures -- the definition of the ImportSet class
+* data structures -- the definition of the InvolvedFilter class
 * plugin code -- core plugin functionality
 
 """
 # region imports
 
 import sys
-from collections.abc import Hashable
 from functools import lru_cache
 from importlib import import_module
-from inspect import ismodule
+from importlib.util import find_spec
 from pathlib import Path
 from types import ModuleType
-from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import pytest
 
 # endregion
 
@@ -41,6 +42,13 @@ def pytest_addoption(parser):
     )
 
 
+def pytest_configure(config):
+    """Give the config somewhere to keep the filter of involved files and
+    members, so the collection hooks can read it as a plain attribute. It is
+    filled in by pytest_pycollect_makeitem the first time it's needed."""
+    config._involved_filter = None
+
+
 def pytest_report_header(config):
     """Add the files being covered to the pytest preamble, via the
     pytest_report_header hook"""
@@ -55,12 +63,24 @@ def pytest_report_header(config):
     return []
 
 
+@pytest.hookimpl(tryfirst=True)
 def pytest_pycollect_makeitem(collector, name, obj):
-    """Don't collect from modules that don't import any relevant files"""
-    involved_files_and_members = get_involved_files_and_members(collector.config)
-
-    if involved_files_and_members:
-        if should_module_be_included(collector.module, involved_files_and_members):
+    """Don't collect from modules that don't import any relevant files. This
+    runs before pytest's own implementation, so members of those modules are
+    rejected before pytest starts building items from them"""
+    config = collector.config
+    involved_filter = config._involved_filter
+
+    if involved_filter is None:
+        # Build the filter on first use and stash it on the config, so every
+        # later call is a plain attribute read. This can't happen any earlier
+        # (EG in pytest_configure), since modules passed to --involving may
+        # only be importable once pytest has started importing test modules.
+        involved_filter = get_involved_files_and_members(config)
+        config._involved_filter = involved_filter
+
+    if involved_filter.files:
+        if is_module_included(collector.module, involved_filter):
             return None
         else:
             return []
@@ -68,79 +88,100 @@ def pytest_pycollect_makeitem(collector, name, obj):
     return None
 
 
-# endregion
+def pytest_collection_modifyitems(session, config, items):
+    """As a safety net, deselect any items collected from modules that
+    pytest_pycollect_makeitem should have already kept out, so that no
+    further per-item work is done on them"""
+    involved_filter = config._involved_filter
 
-# region datastructures
+    if involved_filter is None or not involved_filter.files:
+        return
 
+    selected = []
+    deselected = []
 
-class ImportSet:
-    """A utility class for holding which members from a module have been
-    imported into a file, plus if the module itself has been. This class
-    is used in two ways:
+    for item in items:
+        module = getattr(item, "module", None)
 
-    - For collecting the relevant files and members specified using --involving
-    - For collecting the imports in a module.
+        if module is None or is_module_included(module, involved_filter):
+            selected.append(item)
+        else:
+            deselected.append(item)
 
-    Once both have been done, comparing the two to see if any relevant things
-    are imported into a module is much simpler.
-    """
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
 
-    def __init__(self, module_file, has_full_import, imported_members=None):
-        """Constructor
-
-        Arguments:
-            module_file (ModuleType): The file where a module is defined
-            has_full_import (bool): Whether or not the module is imported
-                                    completely into the module this ImportSet
-                                    belongs to
-        Keyword Arguments:
-            imported_members (Set[str]): Set of members imported into the module
-                                        (default: set())
-        """
-        self.module_file = module_file
-        self.has_full_import = has_full_import
-        self.imported_members = imported_members or set()
-
-    def __hash__(self):
-        """Hash implementation to use with @lru_cache"""
-        return hash(
-            (self.module_file, self.has_full_import, frozenset(self.imported_members))
-        )
 
-    def __eq__(self, other):
-        """Equality implementation mostly used for testing"""
-        if not isinstance(other, ImportSet):
-            return False
-        if not self.module_file == other.module_file:
-            return False
-        elif self.has_full_import != other.has_full_import:
-            return False
-        else:
-            return self.imported_members == other.imported_members
-
-    def __repr__(self):
-        """The __repr__ of an ImportSet is a string that allows it to be
-        reconstructed completely"""
-        return (
-            f"ImportSet('{self.module_file}', "
-            f"{self.has_full_import}, {self.imported_members})"
-        )
+@pytest.hookimpl(hookwrapper=True)
+def pytest_collection(session):
+    """Scope the plugin's caches to the collection phase. They index which
+    files each module member comes from, and which modules have been included,
+    so that shared imports are only looked up once across all the collected
+    modules. Nothing needs them once collection (and with it
+    pytest_collection_modifyitems) is over, and they hold references to every
+    member seen, so they are dropped straight away rather than at the end of
+    the session."""
+    clear_caches()
+    yield
+    clear_caches()
 
-    def __str__(self):
-        """The __str__ of an ImportSet is a string that indicates the module file,
-        whether it's fully imported or not, and then a list of its members."""
-        module_status_string = "✓" if self.has_full_import else "✗"
-        return (
-            f"<ImportSet "
-            f"{self.module_file} [{module_status_string}] "
-            f"-- {self.imported_members} >"
-        )
+
+# endregion
+
+# region datastructures
+
+
+class InvolvedFilter(NamedTuple):
+    """The files and members specified using --involving, in the shape that
+    should_module_be_included compares modules against. It is built once per
+    session by build_involved_files_and_members.
+
+    Attributes:
+        files (FrozenSet[str]): Every file specified with --involving
+        full_imports (FrozenSet[str]): Files specified without a ::member, so
+                                       importing anything from them counts
+        members_by_file (Dict[str, FrozenSet[str]]): Members specified with
+                                                     ::member, by file
+        files_only (bool): Whether every file is in full_imports, in which
+                           case members never need comparing
+    """
+
+    files: FrozenSet[str]
+    full_imports: FrozenSet[str]
+    members_by_file: Dict[str, FrozenSet[str]]
+    files_only: bool
 
 
 # endregion
 
 # region plugin code
 
+# Caches used for the duration of the collection phase, and cleared either side
+# of it by the pytest_collection hookwrapper. Most members of a test module
+# (pytest, os, shared helpers...) are also members of many other test modules,
+# so resolving where each one is defined only once saves repeating the same
+# attribute and sys.modules lookups for every module.
+#
+# _MEMBER_FILE_CACHE maps id(member) to (member, file, is_module). The member
+# itself is kept in the entry so its id can't be reused by another object,
+# which also keeps the ids in _USABLE_NAME_CACHE valid, as names are only
+# looked up for members whose file has been. _MODULE_DECISIONS keeps modules
+# alive in the same way for is_module_included.
+_SENTINEL = object()
+_MEMBER_FILE_CACHE: Dict[int, Tuple[object, Optional[str], bool]] = {}
+_USABLE_NAME_CACHE: Dict[Tuple[int, str], str] = {}
+_MODULE_DECISIONS: Dict[int, Tuple[ModuleType, bool]] = {}
+
+
+def clear_caches():
+    """Empty the caches kept for the duration of the collection phase"""
+    _MEMBER_FILE_CACHE.clear()
+    _USABLE_NAME_CACHE.clear()
+    _MODULE_DECISIONS.clear()
+    _canonical_path.cache_clear()
+    _get_module_file.cache_clear()
+
 
 @lru_cache()
 def get_involved_objects(config):
@@ -149,114 +190,154 @@ def get_involved_objects(config):
     return config.getoption("--involving") or []
 
 
-@lru_cache()
-def get_involved_files_and_members(config) -> Dict[str, Set[str]]:
+def get_involved_files_and_members(config) -> InvolvedFilter:
     """Given a pytest config, return the set of files specified by the
-    --involving flag
+    --involving flag. This is only called once per session, as the result is
+    kept on the config (see pytest_pycollect_makeitem).
 
     Args:
         config: pytest config object
 
     Returns:
-        Dict[str, Set[str]]: Output of build_involved_files_and_members
+        InvolvedFilter: Output of build_involved_files_and_members
     """
     return build_involved_files_and_members(get_involved_objects(config))
 
 
-@lru_cache()
-def should_module_be_included(
-    module: ModuleType, involved_filter: FrozenSet[Tuple[str, FrozenSet[str]]]
-):
-    """Given a Python module and a dictionary filter object of files and members
-    specified with the --involving flag, decide if tests from the module
-    should be included in the pytest run.
+def is_module_included(module: ModuleType, involved_filter: InvolvedFilter) -> bool:
+    """Cached version of should_module_be_included. pytest calls
+    pytest_pycollect_makeitem once for every member of a module, but the
+    decision only needs making once per module, so it is kept in
+    _MODULE_DECISIONS (keyed by id(module) only -- the filter doesn't change
+    during a session)"""
+    cached = _MODULE_DECISIONS.get(id(module))
+
+    if cached is None:
+        cached = (module, should_module_be_included(module, involved_filter))
+        _MODULE_DECISIONS[id(module)] = cached
+
+    return cached[1]
+
+
+def should_module_be_included(module: ModuleType, involved_filter: InvolvedFilter):
+    """Given a Python module and a filter of files and members specified with
+    the --involving flag, decide if tests from the module should be included in
+    the pytest run.
+
+    This is done in a single pass over the module's members, returning as soon
+    as one of them matches the filter. Most modules import nothing from any
+    involved file, so on the common path this builds nothing and looks up
+    little more than one cached file per member.
 
     Arguments:
         module (ModuleType): The module about which a decision should be made
-        involved_filter (Dict[str, Set[str]]): The filter of involved files
-                                                 and members to check if the
-                                                 module imports
+        involved_filter (InvolvedFilter): The filter of involved files
+                                          and members to check if the
+                                          module imports
     Returns:
-        Optional[List]: The empty list to avoid collecting test from the module,
-                        or None to return control to pytest.
+        bool: Whether tests should be collected from the module
     """
-    imported_files_and_members = get_members_by_file(module.__dict__)
-    imported_files = set(imported_files_and_members.keys())
+    involved_files, full_imports, members_by_file, files_only = involved_filter
 
-    involved_files_and_members = dict(involved_filter)
-    involved_files = set(involved_files_and_members.keys())
+    if files_only:
+        # The common case of --involving only whole files: importing anything
+        # from them counts, so there's no need to look at member names.
+        return module_imports_from_any(module, involved_files)
 
-    intersecting_files = imported_files & involved_files
+    # Bound locally, as this loop runs for every member of every module
+    get_file = get_member_file
 
-    if not intersecting_files:
-        # If there no files specified with --involving which are imported
-        # into this module, return False.
-        return False
-    else:
-        for file_name in intersecting_files:
-            imported_set = imported_files_and_members[file_name]
-            involved_set = involved_files_and_members[file_name]
-
-            if imported_set.has_full_import or involved_set.has_full_import:
-                # If either set has a full import, return True.
-                # This deals with 2 cases:
-                #
-                # (1) involved module, imported member
-                # (2) involved member, imported module
-                #
-                # In either case there is a possibility that the module
-                # contains a relevant test, and recall is more important than
-                # precision.
-                return True
-
-            imported_file_members = imported_set.imported_members
-            involved_file_members = involved_set.imported_members
-
-            if involved_file_members & imported_file_members:
-                # Non-empty intersection between imported and involved members.
-                # Return True.
-                return True
-
-        # If we've reached the end of iterating through the intersecting files
-        # and haven't returned already, then even though there are some files
-        # in common, there are no matching members, so we should return False.
-        return False
-
-    # Default: Return True to continue normal test collection from this module.
-    return True
-
-
-def build_involved_files_and_members(
-    raw_args: List[str]
-) -> FrozenSet[Tuple[str, ImportSet]]:
+    for member_name, member in module.__dict__.items():
+        if member_name.startswith("__"):
+            # Skip __builtins__, __loader__, __spec__, etc., which are in every
+            # module and can't have been imported from an involved file
+            continue
+
+        member_file, is_module = get_file(member)
+
+        if member_file not in involved_files:
+            continue
+
+        if is_module or member_file in full_imports:
+            # If either side has a full import, return True.
+            # This deals with 2 cases:
+            #
+            # (1) involved module, imported member
+            # (2) involved member, imported module
+            #
+            # In either case there is a possibility that the module
+            # contains a relevant test, and recall is more important than
+            # precision.
+            return True
+
+        if get_usable_name(member, member_name) in members_by_file[member_file]:
+            # The imported member is one of the involved members.
+            return True
+
+    # If we've reached the end of the module's members and haven't returned
+    # already, then nothing it imports matches the filter.
+    return False
+
+
+def module_imports_from_any(module: ModuleType, files: FrozenSet[str]) -> bool:
+    """Check whether a module imports anything from any of the given files,
+    stopping at the first member that comes from one of them.
+
+    Arguments:
+        module (ModuleType): The module to check
+        files (FrozenSet[str]): The files to look for
+
+    Returns:
+        bool: True if any member of the module is, or is defined in, one of
+              the files
+    """
+    get_file = get_member_file
+
+    for member_name, member in module.__dict__.items():
+        if member_name.startswith("__"):
+            # Skip __builtins__ etc., as in should_module_be_included
+            continue
+
+        if get_file(member)[0] in files:
+            return True
+
+    return False
+
+
+def build_involved_files_and_members(raw_args: List[str]) -> InvolvedFilter:
     """Given a list of raw argument values passed into the --involving flag
-    from a pytest config object, build a dictionary mapping from the file
-    where an object is defined to a set of objects defined in that module
-    that the user has requested.
+    from a pytest config object, build a filter of the files where the
+    objects are defined, split into files the user has requested in full and
+    the objects requested from the rest.
 
     Args:
         raw_args (List[str]): list of raw arguments provided to the
         --involving flag
 
     Returns:
-        FrozenSet[Tuple[str, FrozenSet[str]]]: Keys are files to check for tests
-            involving, values are ImportSets of members in those files.
+        InvolvedFilter: The files to check for tests involving, and the
+            members in those files.
     """
-    involved_files_and_members = {}
+    full_imports = set()
+    members_by_file = {}
 
     for involved_object in raw_args:
         path = resolve_file_or_module(involved_object)
         member = resolve_member_reference(involved_object)
 
-        if path not in involved_files_and_members:
-            involved_files_and_members[path] = ImportSet(path, False)
-
         if member:
-            involved_files_and_members[path].imported_members.add(member)
+            members_by_file.setdefault(path, set()).add(member)
         else:
-            involved_files_and_members[path].has_full_import = True
-
-    return frozenset(involved_files_and_members.items())
+            full_imports.add(path)
+
+    return InvolvedFilter(
+        files=frozenset(full_imports.union(members_by_file)),
+        full_imports=frozenset(full_imports),
+        members_by_file={
+            path: frozenset(members) for path, members in members_by_file.items()
+        },
+        files_only=full_imports.issuperset(members_by_file),
+    )
 
 
 def resolve_file_or_module(raw_argument: str) -> str:
@@ -266,10 +347,45 @@ def resolve_file_or_module(raw_argument: str) -> str:
 
     if file_or_module.endswith(".py"):
         # .py file specified on command line, so just resolve it
-        return str(Path(file_or_module).resolve())
+        return _canonical_path(file_or_module)
     else:
         # Not a .py file, so probably a module.
-        return import_module(file_or_module).__file__
+        module_file = _get_module_file(file_or_module)
+
+        if module_file is None:
+            # EG a namespace package, which isn't defined in any one file.
+            # There's nothing to compare members against, so it can't be used.
+            raise pytest.UsageError(
+                f"--involving={raw_argument}: {file_or_module} has no source "
+                "file (is it a namespace package?)"
+            )
+
+        return _canonical_path(module_file)
+
+
+@lru_cache(maxsize=None)
+def _canonical_path(path: str) -> str:
+    """Resolve a path to an absolute one, and intern the result. Both involved
+    files and the files module members come from go through here, so a file
+    always ends up as the same string object, and comparing them is as cheap
+    as it gets. Resolving hits the filesystem, so the result is cached too."""
+    return sys.intern(str(Path(path).resolve()))
+
+
+@lru_cache(maxsize=256)
+def _get_module_file(module_name: str) -> Optional[str]:
+    """Find the file a module is defined in. This is cached for when the same
+    module is passed to --involving several times (EG with a different
+    ::member each time). The module's spec is enough to find its file without
+    running it (although its parent packages are still imported), so it is
+    only imported as a fallback for modules without a location on disk, and
+    gives None for modules that don't have a file even then."""
+    spec = find_spec(module_name)
+
+    if spec is not None and spec.has_location:
+        return spec.origin
+
+    return getattr(import_module(module_name), "__file__", None)
 
 
 def resolve_member_reference(raw_argument: str) -> Optional[str]:
@@ -300,49 +416,69 @@ def resolve_member_reference(raw_argument: str) -> Optional[str]:
     return None
 
 
-def get_members_by_file(module_members: Dict[str, object]) -> Dict[str, ImportSet]:
-    """Given a collection of a module's members, return a mapping from the files
-    where those members are defined to the names of the members.
+def get_usable_name(member: object, member_name: str) -> str:
+    """Given a member of a module and the name it has there, return the name
+    to compare against involved members -- the name it was defined with, if
+    it has a usable one, so that aliased imports still match. Cached in
+    _USABLE_NAME_CACHE."""
+    usable_name = _USABLE_NAME_CACHE.get((id(member), member_name))
+
+    if usable_name is None:
+        usable_name = getattr(member, "__name__", member_name)
+
+        if not isinstance(usable_name, str):
+            # Names are compared against strings from the command line, so
+            # anything else (EG an unhashable list) can't be used. A plain
+            # isinstance check is also much cheaper than checking Hashable.
+            usable_name = member_name
+
+        _USABLE_NAME_CACHE[id(member), member_name] = usable_name
+
+    return usable_name
+
+
+def get_member_file(member: object) -> Tuple[Optional[str], bool]:
+    """Cached version of resolve_member_file -- see the comment above
+    _MEMBER_FILE_CACHE"""
+    cached = _MEMBER_FILE_CACHE.get(id(member), _SENTINEL)
+
+    if cached is _SENTINEL:
+        cached = (member, *resolve_member_file(member))
+        _MEMBER_FILE_CACHE[id(member)] = cached
+
+    return cached[1:]
+
+
+def resolve_member_file(member: object) -> Tuple[Optional[str], bool]:
+    """Given a member of a module, find the file it was defined in.
 
     Arguments:
-        module_members (Dict[str, object]): Module __dict__ attribute value
+        member (object): The member to look up
 
     Returns:
-        Dict[str, ImportSet]: Mapping from module file name to a set of members
-                             imported from the module.
+        Tuple[Optional[str], bool]: The file the member is defined in (or
+            None if it can't be found), and whether the member is itself
+            a module.
     """
-    module_files = {}
-
-    for member_name, member in module_members.items():
-        if ismodule(member) and hasattr(member, "__file__"):
-            if member.__file__ not in module_files:
-                module_files[member.__file__] = ImportSet(member.__file__, True)
-            else:
-                module_files[member.__file__].has_full_import = True
-        else:
-            module_name = getattr(member, "__module__", None)
-            if module_name:
-                module = get_module(module_name)
-                if hasattr(module, "__file__"):
-
-                    if module.__file__ not in module_files:
-                        module_files[module.__file__] = ImportSet(
-                            module.__file__, False
-                        )
-
-                    usable_name = getattr(member, "__name__", member_name)
+    # Checking the exact type first is cheaper than inspect.ismodule, which
+    # costs an extra function call for every member of every collected module
+    is_module = type(member) is ModuleType or isinstance(member, ModuleType)
 
-                    if not isinstance(usable_name, Hashable):
-                        usable_name = member_name
+    if is_module and getattr(member, "__file__", None):
+        return _canonical_path(member.__file__), True
 
-                    module_files[module.__file__].imported_members.add(usable_name)
+    module_name = getattr(member, "__module__", None)
+    if module_name:
+        module = get_module(module_name)
+        if getattr(module, "__file__", None):
+            return _canonical_path(module.__file__), False
 
-    return module_files
+    return None, False
 
 
 def get_module(name):
     """This helper method has been extracted to make it easier to test the
-    logic of get_members_by_file"""
+    logic of resolve_member_file"""
     return sys.modules[name]
 
 
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""Plain helpers for the plugin tests: the sources of the files each test
+project is made of, a way to put them into a project cheaply, and assertions
+about the output of the inner pytest runs"""
+import errno
+import hashlib
+import os
+import re
+import shutil
+from functools import lru_cache
+from typing import Pattern, Tuple
+
+# The header line the plugin starts its list of involved paths with
+_HEADER = ("Running tests involving:",)
+
+# The source of each module made by make_project
+_MODULE_TEMPLATE = """
+def func_{name}():
+    return "{name}"
+
+class Class{title}:
+    pass
+"""
+
+# The source of each test file the plugin tests make, keyed by the import each
+# of them makes
+TEST_SOURCES = {
+    "import_one": """
+import one
+
+def test_func_one():
+    assert one.func_one() == "one"
+""",
+    "import_one_aliased": """
+import one as alias
+
+def test_func_one():
+    assert alias.func_one() == "one"
+""",
+    "import_func_one": """
+from one import func_one
+
+def test_func_one():
+    assert func_one() == "one"
+""",
+    "import_func_one_aliased": """
+from one import func_one as alias
+
+def test_func_one():
+    assert alias() == "one"
+""",
+    "import_two": """
+import two
+
+def test_func_two():
+    assert two.func_two() == "two"
+""",
+    "import_func_two": """
+from one import func_two
+
+def test_func_two():
+    assert func_two() == "two"
+""",
+    "import_nested_module": """
+from one import two
+
+def test_func_one():
+    assert two.func_one() == "one"
+""",
+    "import_nested_func_one": """
+from one.two import func_one
+
+def test_func_one():
+    assert func_one() == "one"
+""",
+}
+
+
+@lru_cache(maxsize=None)
+def module_source(name: str) -> str:
+    """Given a module name, return the source of the module
+    make_project creates with that name"""
+    return _MODULE_TEMPLATE.format(name=name, title=name.title())
+
+
+@lru_cache(maxsize=None)
+def _lines_pattern(patterns: Tuple[str, ...]) -> Pattern:
+    """Given some patterns using * as a wildcard, compile a regex matching
+    lines which match each of them in turn, with any other lines in between"""
+    lines = ("^" + ".*".join(map(re.escape, p.split("*"))) + "$" for p in patterns)
+    return re.compile(r"(?:\n.*)*?\n".join(lines), re.MULTILINE)
+
+
+def assert_lines(result, *patterns):
+    """Assert that the output of an inner pytest run has lines matching each of
+    the patterns in order, like result.stdout.fnmatch_lines, but with a single
+    search over the output
+
+    Arguments:
+        result (RunResult): The result of the inner pytest run
+        patterns (str): Line patterns, using * as a wildcard
+    """
+    output = "\n".join(result.stdout.lines)
+
+    assert _lines_pattern(patterns).search(output), "\n".join(
+        ["No lines matching:", *patterns, "in output:", output]
+    )
+
+
+def assert_involved(result, *paths, test_name="test_func_one"):
+    """Assert that the output of an inner --collect-only run reports running tests
+    involving each of the paths in turn, and then collects the given test
+
+    Arguments:
+        result (RunResult): The result of the inner pytest run
+        paths (str): Patterns for the involved paths listed in the header
+        test_name (str): The name of the test which should be collected
+    """
+    assert_lines(result, *_HEADER, *paths, f"*<Function {test_name}>*")
+
+
+def link_source(involve_base, source, target):
+    """Put a file holding source at target. Each distinct source is written
+    once, into involve_base under a hash of its contents, and hardlinked from
+    there, falling back to a copy only where the two are on different
+    filesystems. Anything already at target is removed first, so a file linked
+    to the cache is replaced rather than written through"""
+    digest = hashlib.blake2b(source.encode(), digest_size=8).hexdigest()
+    cached_file = involve_base / f"{digest}.py"
+
+    if not cached_file.exists():
+        cached_file.write_text(source)
+
+    try:
+        os.unlink(str(target))
+    except FileNotFoundError:
+        pass
+
+    try:
+        os.link(str(cached_file), str(target))
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(str(cached_file), str(target))
@@ -1 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Fixtures shared by the plugin tests. The plugin tests each build a small
+project of python files in a pytester directory and run pytest over it, and most
+of those files are the same from one test to the next, so they are written once
+per session and hardlinked into each pytester directory"""
+import pytest
+
+from ._helpers import TEST_SOURCES, link_source, module_source
+
 pytest_plugins = "pytester"
+
+# Options for every inner pytest run. Plugins aren't autoloaded from entry
+# points, so the plugin under test is loaded explicitly; the generated tests
+# don't need their asserts rewritten, and nothing should be cached between runs
+INNER_ARGS = ("-p", "pytest_involve", "-p", "no:cacheprovider", "--assert=plain")
+
+
+@pytest.fixture(scope="session")
+def involve_base(tmp_path_factory):
+    """A directory shared by the whole session, holding the files which are
+    the same in every test project"""
+    return tmp_path_factory.mktemp("involve-base")
+
+
+@pytest.fixture
+def make_project(pytester, involve_base):
+    """Return a function which creates the files of a test project in the
+    pytester directory, in one go. It takes a list of module names, and keyword
+    arguments mapping test file names to keys of TEST_SOURCES. Every module will
+    contain one function and one class with names based on the module name.
+
+    Each file is only written once per session, into involve_base, and
+    hardlinked from there into the pytester directory. pytester still gets a
+    fresh directory per test, since each inner pytest run needs its own cwd,
+    sys.path and sys.modules. Since a linked file shares its contents with
+    every other test using the same source, it must never be rewritten in
+    place; replace it (unlink it first) instead.
+    """
+
+    def make(module_names=(), **test_files):
+        sources = {name: module_source(name) for name in module_names}
+        sources.update(
+            (name, TEST_SOURCES[variant]) for name, variant in test_files.items()
+        )
+
+        for name, source in sources.items():
+            link_source(involve_base, source, pytester.path / f"{name}.py")
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def involve_ini(involve_base):
+    """An empty ini file for every inner pytest run to use, so none of them
+    have to look for one"""
+    ini_file = involve_base / "pytest.ini"
+    ini_file.write_text("[pytest]\n")
+    return ini_file
+
+
+@pytest.fixture
+def runpytest(pytester, monkeypatch, involve_ini):
+    """Return a function which runs pytest in-process over the pytester
+    directory, with INNER_ARGS ahead of the arguments it is given. Entry point
+    plugins aren't loaded, so each run doesn't have to scan every installed
+    distribution, and the ini file and rootdir are given rather than searched
+    for"""
+    monkeypatch.setenv("PYTEST_DISABLE_PLUGIN_AUTOLOAD", "1")
+    pinned_args = ("-c", str(involve_ini), "--rootdir", str(pytester.path))
+
+    def run(*args):
+        return pytester.runpytest_inprocess(*INNER_ARGS, *pinned_args, *args)
+
+    return run
@@ -1,28 +1,112 @@
 # -*- coding: utf-8 -*-
 """This module contains unit tests for the functions in pytest_involve.py"""
 import os
+import sys
 from pathlib import Path
+from types import ModuleType, SimpleNamespace
 from unittest import mock
 
 import pytest
 
 from pytest_involve import (
-    ImportSet,
+    _canonical_path,
+    InvolvedFilter,
     build_involved_files_and_members,
+    clear_caches,
     get_involved_files_and_members,
     get_involved_objects,
-    get_members_by_file,
+    is_module_included,
+    module_imports_from_any,
+    pytest_collection,
+    pytest_collection_modifyitems,
+    pytest_configure,
     pytest_pycollect_makeitem,
     pytest_report_header,
     resolve_file_or_module,
+    resolve_member_file,
     resolve_member_reference,
     should_module_be_included,
 )
 
 MODULE = "pytest_involve"
 
+ONE_FILE = str(Path("one.py").resolve())
+TWO_FILE = str(Path("two.py").resolve())
+OS_FILE = str(Path(os.__file__).resolve())
 
-@mock.patch(MODULE + ".get_involved_objects", autospec=True)
+# Filters are immutable, so tests share these rather than building their own
+NOTHING_INVOLVED = InvolvedFilter(frozenset(), frozenset(), {}, True)
+ONE_FULL = InvolvedFilter(frozenset([ONE_FILE]), frozenset([ONE_FILE]), {}, True)
+TWO_FULL = InvolvedFilter(frozenset([TWO_FILE]), frozenset([TWO_FILE]), {}, True)
+ONE_FUNC_ONE = InvolvedFilter(
+    frozenset([ONE_FILE]), frozenset(), {ONE_FILE: frozenset(["func_one"])}, False
+)
+ONE_FUNC_TWO = InvolvedFilter(
+    frozenset([ONE_FILE]), frozenset(), {ONE_FILE: frozenset(["func_two"])}, False
+)
+ONE_FULL_AND_FUNC_TWO = InvolvedFilter(
+    frozenset([ONE_FILE]),
+    frozenset([ONE_FILE]),
+    {ONE_FILE: frozenset(["func_two"])},
+    True,
+)
+
+ONE_MODULE = ModuleType("one")
+ONE_MODULE.__file__ = "one.py"
+
+# Input and expected output for test_build_involved_files_and_members
+BUILD_INPUT = (
+    "./module/file_one.py",
+    "./module/file_two.py::function_two",
+    "./module/file_three.py::function_three",
+    "./module/file_three.py::ClassThree",
+)
+BUILD_RESOLVED_FILES = ("file_one.py", "file_two.py", "file_three.py", "file_three.py")
+BUILD_RESOLVED_MEMBERS = (None, "function_two", "function_three", "ClassThree")
+BUILD_CALLS = [mock.call(f) for f in BUILD_INPUT]
+BUILD_EXPECTED = InvolvedFilter(
+    files=frozenset(["file_one.py", "file_two.py", "file_three.py"]),
+    full_imports=frozenset(["file_one.py"]),
+    members_by_file={
+        "file_two.py": frozenset(["function_two"]),
+        "file_three.py": frozenset(["function_three", "ClassThree"]),
+    },
+    files_only=False,
+)
+
+
+def make_test_module(**members):
+    """Make a module holding the given members, to decide about with
+    should_module_be_included"""
+    module = ModuleType("test_module")
+    module.__dict__.update(members)
+    return module
+
+
+def make_one_member(name):
+    """Make a function that will look like it was defined in one.py, as long as
+    get_module is patched to return ONE_MODULE"""
+
+    def member():
+        pass
+
+    member.__name__ = name
+    member.__module__ = "one"
+    return member
+
+
+@pytest.fixture(autouse=True)
+def clear_plugin_caches():
+    """The plugin caches what it learns about module members and files until
+    the end of the collection phase, so make sure each test starts from empty
+    caches, and doesn't leave anything behind for the in-process runs in
+    test_plugin.py"""
+    clear_caches()
+    yield
+    clear_caches()
+
+
+@mock.patch(MODULE + ".get_involved_objects")
 def test_pytest_report_header(mock_get_involved):
     mock_get_involved.return_value = ["one.py", "two.py"]
 
@@ -32,160 +116,134 @@ def test_pytest_report_header(mock_get_involved):
         "    two.py",
     ]
 
-    mock_get_involved.assert_called()
+    assert mock_get_involved.called
+
+
+@mock.patch(MODULE + ".is_module_included")
+@mock.patch(MODULE + ".get_involved_files_and_members")
+def test_pytest_pycollect_make_item_stores_filter(
+    mock_get_involved, mock_should_include
+):
+    """Test that pytest_pycollect_make_item builds the involved filter once and
+    stores it on the config for later calls"""
+    mock_get_involved.return_value = ONE_FULL
+    mock_should_include.return_value = True
+
+    mock_collector = SimpleNamespace(module=object(), config=SimpleNamespace())
+    pytest_configure(mock_collector.config)
+
+    pytest_pycollect_makeitem(mock_collector, "test_one", "obj_one")
+    pytest_pycollect_makeitem(mock_collector, "test_two", "obj_two")
+
+    assert mock_get_involved.call_args_list == [mock.call(mock_collector.config)]
+    assert mock_collector.config._involved_filter == ONE_FULL
 
 
-@mock.patch(MODULE + ".should_module_be_included", autospec=True)
-@mock.patch(MODULE + ".get_involved_files_and_members", autospec=True)
-def test_pytest_pycollect_make_item_succeeds(mock_get_involved, mock_should_include):
+@mock.patch(MODULE + ".is_module_included")
+def test_pytest_pycollect_make_item_succeeds(mock_should_include):
     """Test pytest_pycollect_make_item when there are involved values and the
     module should be included"""
-    mock_get_involved.return_value = ["one.py"]
     mock_should_include.return_value = True
 
-    mock_collector = mock.Mock()
+    mock_collector = SimpleNamespace(
+        module=object(), config=SimpleNamespace(_involved_filter=ONE_FULL)
+    )
 
     assert pytest_pycollect_makeitem(mock_collector, "test_one", "obj_one") is None
 
-    mock_get_involved.assert_called()
-    mock_should_include.assert_called_with(mock_collector.module, ["one.py"])
+    assert mock_should_include.call_args == mock.call(mock_collector.module, ONE_FULL)
 
 
-@mock.patch(MODULE + ".should_module_be_included", autospec=True)
-@mock.patch(MODULE + ".get_involved_files_and_members", autospec=True)
-def test_pytest_pycollect_make_item_fails(mock_get_involved, mock_should_include):
+@mock.patch(MODULE + ".is_module_included")
+def test_pytest_pycollect_make_item_fails(mock_should_include):
     """Test pytest_pycollect_make_item when there are involved values and the
     module should not be included"""
-    mock_get_involved.return_value = ["one.py"]
     mock_should_include.return_value = False
 
-    mock_collector = mock.Mock()
+    mock_collector = SimpleNamespace(
+        module=object(), config=SimpleNamespace(_involved_filter=ONE_FULL)
+    )
 
     assert pytest_pycollect_makeitem(mock_collector, "test_one", "obj_one") == []
 
-    mock_get_involved.assert_called()
-    mock_should_include.assert_called_with(mock_collector.module, ["one.py"])
+    assert mock_should_include.call_args == mock.call(mock_collector.module, ONE_FULL)
 
 
-@mock.patch(MODULE + ".should_module_be_included", autospec=True)
-@mock.patch(MODULE + ".get_involved_files_and_members", autospec=True)
-def test_pytest_pycollect_make_item_not_involved(
-    mock_get_involved, mock_should_include
-):
+@mock.patch(MODULE + ".is_module_included")
+def test_pytest_pycollect_make_item_not_involved(mock_should_include):
     """Test pytest_pycollect_make_item when there are no involved values"""
-    mock_get_involved.return_value = []
-
-    mock_collector = mock.Mock()
+    mock_collector = SimpleNamespace(
+        module=object(),
+        config=SimpleNamespace(_involved_filter=NOTHING_INVOLVED),
+    )
 
     assert pytest_pycollect_makeitem(mock_collector, "test_one", "obj_one") is None
 
-    mock_get_involved.assert_called()
-    mock_should_include.assert_not_called
-
-
-def test_ImportSet_init():
-    """Test the ImportSet constructor"""
-    import_set = ImportSet("module.py", True, {"member"})
+    assert not mock_should_include.called
 
-    assert import_set.has_full_import
-    assert import_set.module_file == "module.py"
-    assert import_set.imported_members == {"member"}
 
+@mock.patch(MODULE + ".is_module_included")
+def test_pytest_collection_modifyitems(mock_is_included):
+    """Test that pytest_collection_modifyitems deselects items from modules
+    that shouldn't be included, and keeps items that aren't from a module"""
+    included, excluded = ModuleType("included"), ModuleType("excluded")
+    mock_is_included.side_effect = lambda module, _filter: module is included
 
-def test_ImportSet_equality():
-    """Test the ImportSet __eq__ implementation"""
-
-    # Equal -- same file
-    assert ImportSet("module.py", True) == ImportSet("module.py", True)
-
-    # Equal -- same file, same members
-    assert ImportSet("module.py", False, {"member1"}) == ImportSet(
-        "module.py", False, {"member1"}
-    )
-
-    # Not equal -- one has full import, other doesn't
-    assert ImportSet("module.py", True) != ImportSet("module.py", False)
+    mock_config = mock.Mock()
+    mock_config._involved_filter = ONE_FULL
 
-    # Not equal -- different files
-    assert ImportSet("module1.py", True) != ImportSet("module2.py", True)
+    included_item = SimpleNamespace(module=included)
+    excluded_item = SimpleNamespace(module=excluded)
+    other_item = SimpleNamespace()
+    items = [included_item, excluded_item, other_item]
 
-    # Not equal -- same files, different members
-    assert ImportSet("module.py", False, {"member1"}) != ImportSet(
-        "module.py", False, {"member2"}
-    )
+    pytest_collection_modifyitems(None, mock_config, items)
 
+    assert items == [included_item, other_item]
+    mock_config.hook.pytest_deselected.assert_called_once_with(items=[excluded_item])
 
-def test_ImportSet_hash():
-    """Test the ImportSet __hash__ implementation"""
-    import_set = ImportSet("module.py", True, {"member1"})
-    set_as_tuple = ("module.py", True, frozenset(["member1"]))
 
-    assert hash(import_set) == hash(set_as_tuple)
+def test_pytest_collection_modifyitems_not_involved():
+    """Test that pytest_collection_modifyitems leaves items alone when there
+    are no involved values"""
+    mock_config = SimpleNamespace()
+    pytest_configure(mock_config)
+    items = [SimpleNamespace(module=ModuleType("module"))]
 
+    pytest_collection_modifyitems(None, mock_config, items)
 
-def test_ImportSet_to_string():
-    """Test the ImportSet __str__ implementation"""
-    import_set = ImportSet("module.py", True, {"member1"})
+    assert len(items) == 1
 
-    assert str(import_set) == "<ImportSet module.py [✓] -- {'member1'} >"
-    assert repr(import_set) == "ImportSet('module.py', True, {'member1'})"
 
-
-@mock.patch(MODULE + ".resolve_member_reference", autospec=True)
-@mock.patch(MODULE + ".resolve_file_or_module", autospec=True)
+@mock.patch(MODULE + ".resolve_member_reference")
+@mock.patch(MODULE + ".resolve_file_or_module")
 def test_build_involved_files_and_members(mock_resolve_file, mock_resolve_member):
     """Test that build_involved_files_and_members returns a filter dictionary
     of module files and members within them"""
-    mock_input = [
-        "./module/file_one.py",
-        "./module/file_two.py::function_two",
-        "./module/file_three.py::function_three",
-        "./module/file_three.py::ClassThree",
-    ]
+    # side_effect consumes what it's given, so it gets fresh lists
+    mock_resolve_file.side_effect = list(BUILD_RESOLVED_FILES)
+    mock_resolve_member.side_effect = list(BUILD_RESOLVED_MEMBERS)
 
-    mock_resolve_file.side_effect = [
-        "file_one.py",
-        "file_two.py",
-        "file_three.py",
-        "file_three.py",
-    ]
+    result = build_involved_files_and_members(BUILD_INPUT)
 
-    mock_resolve_member.side_effect = [
-        None,
-        "function_two",
-        "function_three",
-        "ClassThree",
-    ]
+    assert result == BUILD_EXPECTED
 
-    result = build_involved_files_and_members(mock_input)
-
-    assert result == frozenset(
-        [
-            ("file_one.py", ImportSet("file_one.py", True)),
-            ("file_two.py", ImportSet("file_two.py", False, {"function_two"})),
-            (
-                "file_three.py",
-                ImportSet("file_three.py", False, {"function_three", "ClassThree"}),
-            ),
-        ]
-    )
+    assert mock_resolve_file.mock_calls == BUILD_CALLS
+    assert mock_resolve_member.mock_calls == BUILD_CALLS
 
-    assert mock_resolve_file.mock_calls == [mock.call(f) for f in mock_input]
-    assert mock_resolve_member.mock_calls == [mock.call(f) for f in mock_input]
 
-
-@mock.patch(MODULE + ".build_involved_files_and_members", autospec=True)
-@mock.patch(MODULE + ".get_involved_objects", autospec=True)
+@mock.patch(MODULE + ".build_involved_files_and_members")
+@mock.patch(MODULE + ".get_involved_objects")
 def test_get_involved_files_and_members(mock_get_involved, mock_build_involved):
     """Test that get_involved_files_and_members calls
     build_involved_files_and_members with the value of the --involved arguments
     """
-    mock_config = mock.Mock()
+    mock_config = object()
 
     get_involved_files_and_members(mock_config)
 
-    mock_get_involved.assert_called_with(mock_config)
-    mock_build_involved.assert_called_with(mock_get_involved.return_value)
+    assert mock_get_involved.call_args == mock.call(mock_config)
+    assert mock_build_involved.call_args == mock.call(mock_get_involved.return_value)
 
 
 def test_get_involved_objects():
@@ -196,99 +254,159 @@ def test_get_involved_objects():
     assert get_involved_objects(mock_config) == ["one.py", "two.py::Class"]
 
 
-@mock.patch(MODULE + ".ismodule", autospec=True)
-def test_get_members_by_file(mock_is_module):
-    """Test that get_members_by_file returns the
-    correct list of (object, filename) tuples"""
-    mock_is_module.return_value = True
+@mock.patch(MODULE + ".get_module")
+def test_resolve_member_file(mock_get_module):
+    """Test that resolve_member_file finds the files for modules and members"""
+    mock_get_module.return_value.__file__ = "one.py"
 
-    mock_member_1 = mock.Mock()
-    mock_member_1.__name__ = "mock_module_1"
-    mock_member_1.__file__ = "one.py"
+    assert resolve_member_file(os) == (OS_FILE, True)
+    assert resolve_member_file(resolve_member_file) == (ONE_FILE, False)
+    assert resolve_member_file(1) == (None, False)
 
-    mock_member_2 = mock.Mock()
-    mock_member_2.__name__ = "mock_module_2"
-    mock_member_2.__file__ = "two.py"
+    mock_get_module.assert_called_once_with("pytest_involve")
 
-    assert get_members_by_file(
-        {"mock_module_1": mock_member_1, "mock_module_2": mock_member_2}
-    ) == {"one.py": ImportSet("one.py", True), "two.py": ImportSet("two.py", True)}
 
+@mock.patch(MODULE + ".clear_caches")
+def test_pytest_collection(mock_clear_caches):
+    """Test that pytest_collection clears the caches either side of collecting
+    tests"""
+    wrapper = pytest_collection(None)
 
-@mock.patch(MODULE + ".get_module", autospec=True)
-@mock.patch(MODULE + ".ismodule", autospec=True)
-def test_get_members_by_file_bad_name_property(mock_is_module, mock_get_module):
-    """Test that get_members_by_file deals with objects with an unhashable
-    __name__ property (for EG, lists)"""
-    mock_is_module.return_value = False
+    next(wrapper)
 
-    mock_module = mock.Mock()
-    mock_module.__file__ = "one.py"
-    mock_get_module.return_value = mock_module
+    mock_clear_caches.assert_called_once_with()
 
-    mock_member_1 = mock.MagicMock()
-    mock_member_1.__name__ = []
-    mock_member_1.__file__ = "one.py"
+    with pytest.raises(StopIteration):
+        wrapper.send(None)
 
-    assert get_members_by_file({"mock_module_1": mock_member_1}) == {
-        "one.py": ImportSet("one.py", False, {"mock_module_1"})
-    }
+    assert mock_clear_caches.call_count == 2
 
 
-@mock.patch(MODULE + ".get_members_by_file", autospec=True)
-def test_should_module_be_included_correct_module(mock_get_members):
-    """Tests that should_module_be_included returns True for a module
-    importing the correct module"""
-    mock_get_members.return_value = {"one.py": ImportSet("one.py", True)}
-    mock_involved = frozenset([("one.py", ImportSet("one.py", True))])
+@mock.patch(MODULE + ".should_module_be_included")
+def test_is_module_included(mock_should_include):
+    """Test that is_module_included only decides once per module, until the
+    caches are cleared"""
+    mock_should_include.return_value = True
+    module = ModuleType("module")
+    mock_involved = ONE_FULL
 
-    assert should_module_be_included(mock.Mock(), mock_involved)
+    assert is_module_included(module, mock_involved)
+    assert is_module_included(module, mock_involved)
 
+    mock_should_include.assert_called_once_with(module, mock_involved)
 
-@mock.patch(MODULE + ".get_members_by_file", autospec=True)
-def test_should_module_be_included_incorrect_module(mock_get_members):
-    """Tests that should_module_be_included returns False for a module
-    importing the correct module"""
-    mock_get_members.return_value = {"one.py": ImportSet("one.py", True)}
-    mock_involved = frozenset([("two.py", ImportSet("two.py", True))])
+    clear_caches()
+    is_module_included(module, mock_involved)
 
-    assert not should_module_be_included(mock.Mock(), mock_involved)
+    assert mock_should_include.call_count == 2
 
 
-@mock.patch(MODULE + ".get_members_by_file", autospec=True)
-def test_should_module_be_included_no_intersecting_members(mock_get_members):
-    """Test that should_module_be_included returns False when despite files
-    in common there are no members in common"""
-    mock_get_members.return_value = {"one.py": ImportSet("one.py", False, {"func_one"})}
-    mock_involved = frozenset([("one.py", ImportSet("one.py", False, {"func_two"}))])
+@pytest.mark.parametrize(
+    "members, involved, expected",
+    [
+        # Importing an involved module
+        ({"one": ONE_MODULE}, ONE_FULL, True),
+        # Importing a module that isn't involved
+        ({"one": ONE_MODULE}, TWO_FULL, False),
+        # Files in common, but no members in common
+        ({"func_one": make_one_member("func_one")}, ONE_FUNC_TWO, False),
+        # No members in common, but the whole module is imported
+        (
+            {"one": ONE_MODULE, "func_one": make_one_member("func_one")},
+            ONE_FUNC_TWO,
+            True,
+        ),
+        # No members in common, but the whole module is involved
+        ({"func_one": make_one_member("func_one")}, ONE_FULL_AND_FUNC_TWO, True),
+        # An involved member imported under a different name
+        ({"alias": make_one_member("func_one")}, ONE_FUNC_ONE, True),
+        # An involved member without a usable __name__ (EG a list)
+        (
+            {"func_one": SimpleNamespace(__name__=[], __module__="one")},
+            ONE_FUNC_ONE,
+            True,
+        ),
+        # Nothing imported from any involved file
+        ({"os": os, "number": 1}, ONE_FULL, False),
+    ],
+    ids=[
+        "correct_module",
+        "incorrect_module",
+        "no_intersecting_members",
+        "no_intersecting_members_but_whole_import",
+        "no_imported_members_but_whole_module",
+        "aliased_member",
+        "unusable_name",
+        "nothing_imported",
+    ],
+)
+@mock.patch(MODULE + ".get_module")
+def test_should_module_be_included(mock_get_module, members, involved, expected):
+    """Test that should_module_be_included decides correctly for modules
+    importing different things from one.py"""
+    mock_get_module.return_value = ONE_MODULE
+    module = make_test_module(**members)
 
-    assert not should_module_be_included(mock.Mock(), mock_involved)
+    assert should_module_be_included(module, involved) is expected
 
 
-@mock.patch(MODULE + ".get_members_by_file", autospec=True)
-def test_should_module_be_included_no_intersecting_members_but_whole_import(
-    mock_get_members
-):
-    """Test that should_module_be_included returns True when despite files
-    in common there are no members in common, but the test file imports
-    the whole module"""
-    mock_get_members.return_value = {"one.py": ImportSet("one.py", True, {"func_one"})}
-    mock_involved = frozenset([("one.py", ImportSet("one.py", False, {"func_two"}))])
+@mock.patch(MODULE + ".get_module")
+def test_should_module_be_included_files_only(mock_get_module):
+    """Test that should_module_be_included includes a module importing any
+    member of an involved file without looking up member names when only whole
+    files are involved"""
+    mock_get_module.return_value = ONE_MODULE
+    module = make_test_module(func_one=make_one_member("func_one"))
 
-    assert should_module_be_included(mock.Mock(), mock_involved)
+    with mock.patch(MODULE + ".get_usable_name") as mock_get_name:
+        assert should_module_be_included(module, ONE_FULL)
 
+    mock_get_name.assert_not_called()
 
-@mock.patch(MODULE + ".get_members_by_file", autospec=True)
-def test_should_module_be_included_no_imported_members_but_whole_module(
-    mock_get_members
-):
-    """Test that should_module_be_included returns True when there are no
-    members in common but the entire module is specified as an involved file.
-    """
-    mock_get_members.return_value = {"one.py": ImportSet("one.py", False, {"func_one"})}
-    mock_involved = frozenset([("one.py", ImportSet("one.py", True, {"func_two"}))])
 
-    assert should_module_be_included(mock.Mock(), mock_involved)
+@pytest.mark.parametrize(
+    "involved", [ONE_FULL, ONE_FUNC_ONE], ids=["files_only", "members"]
+)
+@mock.patch(MODULE + ".resolve_member_file")
+def test_should_module_be_included_skips_dunders(mock_resolve_member_file, involved):
+    """Test that should_module_be_included, whether or not it only needs to look
+    at files, doesn't look at names like __builtins__ and __loader__, even if
+    they would resolve to an involved file"""
+    mock_resolve_member_file.return_value = (ONE_FILE, True)
+    module = make_test_module(__builtins__=ONE_MODULE, __loader__=ONE_MODULE)
+
+    assert not should_module_be_included(module, involved)
+
+    mock_resolve_member_file.assert_not_called()
+
+
+def test_module_imports_from_any():
+    """Test that module_imports_from_any finds members defined in the files"""
+    path_file = _canonical_path(sys.modules[Path.__module__].__file__)
+    module = make_test_module(os=os, Path=Path)
+
+    assert module_imports_from_any(module, frozenset([OS_FILE]))
+    assert module_imports_from_any(module, frozenset([path_file]))
+    assert not module_imports_from_any(module, frozenset(["one.py"]))
+
+
+@mock.patch(MODULE + ".resolve_member_file")
+def test_module_imports_from_any_caches_members(mock_resolve_member_file):
+    """Test that module_imports_from_any only resolves the file for each member
+    once, until the caches are cleared"""
+    mock_resolve_member_file.return_value = ("one.py", False)
+    member = SimpleNamespace(__name__="func_one")
+    module = make_test_module(func_one=member)
+
+    for _ in range(2):
+        assert not module_imports_from_any(module, frozenset(["two.py"]))
+
+    mock_resolve_member_file.assert_called_once_with(member)
+
+    clear_caches()
+    module_imports_from_any(module, frozenset(["two.py"]))
+
+    assert mock_resolve_member_file.call_count == 2
 
 
 @pytest.mark.parametrize(
@@ -301,6 +419,14 @@ def test_should_module_be_included_no_imported_members_but_whole_module(
         ("module.file::func_name", "func_name"),
         ("module.file::ClassName", "ClassName"),
     ],
+    ids=[
+        "tilde_no_member",
+        "tilde_func",
+        "tilde_class",
+        "mod_no_member",
+        "mod_func",
+        "mod_class",
+    ],
 )
 def test_resolve_member_reference(input, expected):
     """Test that resolve_member_reference handles files and modules with members
@@ -321,15 +447,68 @@ def test_resolve_member_reference_raises():
 def test_resolve_file_or_module() -> str:
     """Test that resolve_file_or_module handles *.py file and modules"""
     # Local file
-    assert resolve_file_or_module("one.py") == str(Path(os.getcwd()) / "one.py")
+    assert resolve_file_or_module("one.py") == str(Path.cwd() / "one.py")
 
     # Other file
-    assert resolve_file_or_module("../one.py") == str(
-        Path(os.getcwd()).parent / "one.py"
-    )
+    assert resolve_file_or_module("../one.py") == str(Path.cwd().parent / "one.py")
 
     # Module -- let's use a built-in to make things easy
     assert resolve_file_or_module("json").endswith("json/__init__.py")
 
     # Nested module -- again, let's use json
     assert resolve_file_or_module("json.decoder").endswith("json/decoder.py")
+
+
+@mock.patch(MODULE + ".import_module")
+@mock.patch(MODULE + ".find_spec")
+def test_resolve_file_or_module_caches_modules(mock_find_spec, mock_import_module):
+    """Test that resolve_file_or_module only looks up each module once"""
+    mock_find_spec.return_value.has_location = True
+    mock_find_spec.return_value.origin = "cached/module.py"
+    module_file = str(Path("cached/module.py").resolve())
+
+    assert resolve_file_or_module("cached.module::one") == module_file
+    assert resolve_file_or_module("cached.module::two") == module_file
+
+    mock_find_spec.assert_called_once_with("cached.module")
+    mock_import_module.assert_not_called()
+
+
+@mock.patch(MODULE + ".import_module")
+@mock.patch(MODULE + ".find_spec")
+def test_resolve_file_or_module_falls_back_to_import(
+    mock_find_spec, mock_import_module
+):
+    """Test that resolve_file_or_module imports modules whose spec doesn't
+    say where they are"""
+    mock_find_spec.return_value.has_location = False
+    mock_import_module.return_value.__file__ = "imported/module.py"
+
+    module_file = str(Path("imported/module.py").resolve())
+
+    assert resolve_file_or_module("imported.module") == module_file
+
+    mock_import_module.assert_called_once_with("imported.module")
+
+
+@mock.patch(MODULE + ".import_module")
+@mock.patch(MODULE + ".find_spec")
+def test_resolve_file_or_module_falls_back_to_import_without_file(
+    mock_find_spec, mock_import_module
+):
+    """Test that resolve_file_or_module rejects modules that have no file even
+    once imported, such as namespace packages"""
+    mock_find_spec.return_value.has_location = False
+    mock_import_module.return_value.__file__ = None
+
+    with pytest.raises(pytest.UsageError, match="nspkg"):
+        resolve_file_or_module("nspkg::member")
+
+    mock_import_module.assert_called_once_with("nspkg")
+
+
+def test_canonical_path():
+    """Test that _canonical_path gives the same string object for every way of
+    writing the same file"""
+    assert _canonical_path("one.py") == ONE_FILE
+    assert _canonical_path("./one.py") is _canonical_path("one.py")
@@ -1,418 +1,128 @@
 # -*- coding: utf-8 -*-
 """This module contains tests for the pytest_involve plugin. These tests are
 a bit more integrated than the helper tests -- they use pytest's built-in
-testdir fixture to create genuine python files and run pytest over them
+pytester fixture to create genuine python files and run pytest over them
 with the plugin installed"""
 import shutil
-from pathlib import Path
-
-
-def make_multiple_modules(test_dir_fixture, file_names):
-    """Given a test directory fixture, create test files
-    corresponding to the list of names passed in. Every file
-    will contain one function and one class with names based
-    on the file_names.
-
-    Arguments:
-        test_dir_fixture (fixture): pytest test_dir fixture
-        file_names (List[str]): List of module names
-    """
-    test_dir_fixture.makepyfile(
-        **{
-            name: f"""
-                def func_{name}():
-                    return "{name}"
-
-                class Class{name.title()}:
-                    pass
-            """
-            for name in file_names
-        }
-    )
-
-
-def test_collection_of_single_file(testdir):
-    """Test that a single python file can be passed via the
-    --involving optional argument"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        import one
-
-        def test_func_one():
-            assert one.func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=./one.py", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*/one.py", "test_one.py::test_func_one PASSED*"]
-    )
-
-    assert result.ret == 0
 
+import pytest
 
-def test_collection_of_single_file_aliased(testdir):
-    """Test that a single python file can be collected via the --involving
-    optional argument when it is imported and aliased using as"""
-    make_multiple_modules(testdir, ["one"])
+from ._helpers import _HEADER, assert_involved, assert_lines
 
-    testdir.makepyfile(
-        test_one="""
-        import one as alias
-
-        def test_func_one():
-            assert alias.func_one() == "one"
-    """
-    )
-    result = testdir.runpytest("--involving=./one.py", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*/one.py", "test_one.py::test_func_one PASSED*"]
-    )
-
-    assert result.ret == 0
+# The different ways of specifying one.py or func_one in it with --involving,
+# along with the header line each of them is reported under
+INVOLVING_ONE = pytest.mark.parametrize(
+    "involving, header",
+    [
+        ("./one.py", "*/one.py"),
+        ("./one.py::func_one", "*/one.py::func_one"),
+        ("one", "*one"),
+        ("one::func_one", "*one::func_one"),
+    ],
+    ids=["file", "file_member", "module", "module_member"],
+)
 
 
-def test_collection_of_multiple_files(testdir):
-    """Test that test cases for multiple files can be collected using the
-    --involving argument multiple times"""
-    make_multiple_modules(testdir, ["one", "two"])
+def test_collection_of_single_file_runs(make_project, runpytest):
+    """Test that the tests collected because of a single python file passed via
+    the --involving optional argument also run"""
+    make_project(["one"], test_one="import_one")
 
-    testdir.makepyfile(
-        test_one="""
-            import one
+    result = runpytest("--involving=./one.py")
 
-            def test_func_one():
-                assert one.func_one() == "one"
-        """,
-        test_two="""
-            import two
-
-            def test_func_two():
-                assert two.func_two() == "two"
-        """,
-    )
-
-    result = testdir.runpytest("--involving=./one.py", "--involving=./two.py", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*/one.py",
-            "*/two.py",
-            "test_one.py::test_func_one PASSED*",
-            "test_two.py::test_func_two PASSED*",
-        ]
-    )
+    assert_lines(result, *_HEADER, "*/one.py", "*1 passed*")
 
     assert result.ret == 0
 
 
-def test_collection_from_single_file_multiple_files_present(testdir):
-    """Test collecting a single file importing a relevant module when
-    multiple files are present"""
-    make_multiple_modules(testdir, ["one", "two"])
+@pytest.mark.parametrize(
+    "test_one",
+    [
+        "import_one",
+        "import_one_aliased",
+        "import_func_one",
+        "import_func_one_aliased",
+    ],
+)
+@INVOLVING_ONE
+def test_collection_of_single_file(
+    make_project, runpytest, test_one, involving, header
+):
+    """Test collecting a single test file which imports a relevant module, or a
+    member of it, whether or not under an alias, whether the module or a member
+    of it is involved, and whether it is given as a file or a module name"""
+    make_project(["one"], test_one=test_one)
 
-    testdir.makepyfile(
-        test_one="""
-            import one
+    result = runpytest("--collect-only", f"--involving={involving}")
 
-            def test_func_one():
-                assert one.func_one() == "one"
-        """,
-        test_two="""
-            import two
-
-            def test_func_two():
-                assert two.func_two() == "two"
-        """,
-    )
-
-    result = testdir.runpytest("--involving=./one.py", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*/one.py", "test_one.py::test_func_one PASSED*"]
-    )
+    assert_involved(result, header)
 
     assert result.ret == 0
-    assert result.parseoutcomes() == {"passed": 1}
 
 
-def test_collection_from_file_member_collects(testdir):
-    """Test collecting a single file importing a member from a relevant
-    module"""
-    make_multiple_modules(testdir, ["one"])
+@pytest.mark.parametrize(
+    "involving, lines",
+    [
+        (
+            ["./one.py", "./two.py"],
+            [
+                "*/one.py",
+                "*/two.py",
+                "*<Function test_func_one>*",
+                "*<Function test_func_two>*",
+                "*= 2 tests collected in *",
+            ],
+        ),
+        (
+            ["./one.py"],
+            ["*/one.py", "*<Function test_func_one>*", "*= 1 test collected in *"],
+        ),
+    ],
+    ids=["multiple_files", "single_file_multiple_files_present"],
+)
+def test_collection_with_multiple_files_present(
+    make_project, runpytest, involving, lines
+):
+    """Test collecting when test files importing more than one module are
+    present, with either all or only some of the modules passed via the
+    --involving argument, possibly more than once"""
+    make_project(["one", "two"], test_one="import_one", test_two="import_two")
 
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one
+    result = runpytest("--collect-only", *(f"--involving={i}" for i in involving))
 
-        def test_func_one():
-            assert func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=./one.py", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*/one.py", "test_one.py::test_func_one PASSED*"]
-    )
+    assert_lines(result, *_HEADER, *lines)
 
     assert result.ret == 0
 
 
-def test_collection_from_file_member_and_module(testdir):
+def test_collection_from_file_member_and_module(make_project, runpytest):
     """Test collecting a single file importing a member from a relevant
     module, and that whole module"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one
+    make_project(["one"], test_one="import_func_one")
 
-        def test_func_one():
-            assert func_one() == "one"
-    """
+    result = runpytest(
+        "--collect-only", "--involving=./one.py::func_two", "--involving=./one.py"
     )
 
-    result = testdir.runpytest(
-        "--involving=./one.py::func_two", "--involving=./one.py", "-v"
-    )
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*./one.py",
-            "*./one.py::func_two",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
+    assert_involved(result, "*./one.py", "*./one.py::func_two")
 
     assert result.ret == 0
 
 
-def test_collection_from_file_member_aliased(testdir):
-    """Test collecting a single file importing a member from a relevant
-    module and aliasing it using as"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one as alias
-
-        def test_func_one():
-            assert alias() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=./one.py", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*/one.py", "test_one.py::test_func_one PASSED*"]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_file_member_collects_other_doesnt(testdir):
-    """Test collecting a single module member from a file in a case where
-    a different member is imported into another file"""
-    testdir.makepyfile(
-        one="""
-            def func_one():
-                return "one"
-
-            def func_two():
-                return "two"
-        """
-    )
-
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one
-
-        def test_func_one():
-            assert func_one() == "one"
-    """,
-        test_two="""
-        from one import func_two
-
-        def test_func_two():
-            assert func_two() == "two"
-    """,
-    )
-
-    result = testdir.runpytest("--involving=./one.py::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*/one.py::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_file_member_whole_file_imported(testdir):
-    """Test collecting a single file importing a relevant module member
-    when that file imports the whole module"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-            import one
-
-            def test_func_one():
-                assert one.func_one() == "one"
-
-        """
-    )
-
-    result = testdir.runpytest("--involving=./one.py::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*/one.py::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_file_member_whole_file_imported_and_aliased(testdir):
-    """Test collecting a single file importing a relevant module member
-    when that file imports the whole module and aliases it"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-            import one as two
-
-            def test_func_one():
-                assert two.func_one() == "one"
-        """
-    )
-
-    result = testdir.runpytest("--involving=./one.py::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*/one.py::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module(testdir):
-    """Test specifying a single module name rather than a file"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        import one
-
-        def test_func_one():
-            assert one.func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=one", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*one", "test_one.py::test_func_one PASSED*"]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module_aliased(testdir):
-    """Test collecting from a file that imports the whole module aliased"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        import one as two
-
-        def test_func_one():
-            assert two.func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=one", "-v")
-
-    result.stdout.fnmatch_lines(
-        ["Running tests involving:", "*one", "test_one.py::test_func_one PASSED*"]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module_member_collects(testdir):
-    """Test specifying a module member rather than a whole module"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one
-
-        def test_func_one():
-            assert func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=one::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*one::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module_member_collects_aliased(testdir):
-    """Test specifying an aliased module member rather than a whole module"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one as alias
-
-        def test_func_one():
-            assert alias() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=one::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*one::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module_member_collects_other_doesnt(testdir):
+@pytest.mark.parametrize(
+    "involving, header",
+    [
+        ("./one.py::func_one", "*/one.py::func_one"),
+        ("one::func_one", "*one::func_one"),
+    ],
+    ids=["file_member", "module_member"],
+)
+def test_collection_member_collects_other_doesnt(
+    pytester, make_project, runpytest, involving, header
+):
     """Test collecting a single module member in a case where a different member
     is imported into another file"""
-    testdir.makepyfile(
+    pytester.makepyfile(
         one="""
             def func_one():
                 return "one"
@@ -422,188 +132,76 @@ def test_collection_from_module_member_collects_other_doesnt(testdir):
         """
     )
 
-    testdir.makepyfile(
-        test_one="""
-        from one import func_one
-
-        def test_func_one():
-            assert func_one() == "one"
-    """,
-        test_two="""
-        from one import func_two
-
-        def test_func_two():
-            assert func_two() == "two"
-    """,
-    )
-
-    result = testdir.runpytest("--involving=one::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*one::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module_member_whole_module_imported(testdir):
-    """Test collecting when a single member is specified but the entire
-    module has been imported into a test file"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        import one
-
-        def test_func_one():
-            assert one.func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("--involving=one::func_one", "-v")
-
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*one::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
-    )
-
-    assert result.ret == 0
-
-
-def test_collection_from_module_member_whole_module_imported_and_aliased(testdir):
-    """Test collecting when a single member is specified but the entire module
-    has been imported into a test file under an alias"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        import one as two
-
-        def test_func_one():
-            assert two.func_one() == "one"
-    """
-    )
+    make_project(test_one="import_func_one", test_two="import_func_two")
 
-    result = testdir.runpytest("--involving=one::func_one", "-v")
+    result = runpytest("--collect-only", f"--involving={involving}")
 
-    result.stdout.fnmatch_lines(
-        [
-            "Running tests involving:",
-            "*one::func_one",
-            "test_one.py::test_func_one PASSED*",
-        ]
+    assert_lines(
+        result,
+        *_HEADER,
+        header,
+        "*<Function test_func_one>*",
+        "*= 1 test collected in *",
     )
 
     assert result.ret == 0
 
 
-def test_import_member_from_nested_module(testdir):
+def test_import_member_from_nested_module(pytester, make_project, runpytest):
     """Test importing a member from a nested module."""
     # make a nested module
-    module_dir = testdir.mkpydir("one")
-    module_file = testdir.makepyfile(
+    module_dir = pytester.mkpydir("one")
+    module_file = pytester.makepyfile(
         two="""
             def func_one():
                 return "one"
         """
     )
-    shutil.move(module_file, str(Path(module_dir) / "two.py"))
+    shutil.move(str(module_file), str(module_dir / "two.py"))
 
-    testdir.makepyfile(
-        test_one="""
-        from one.two import func_one
+    make_project(test_one="import_nested_func_one")
 
-        def test_func_one():
-            assert func_one() == "one"
-    """
+    result = runpytest(
+        "--collect-only", "--no-header", "--involving", "one.two::func_one"
     )
 
-    result = testdir.runpytest("-v", "--involving", "one.two::func_one")
-
-    result.stdout.fnmatch_lines(["test_one.py::test_func_one PASSED*"])
+    assert_lines(result, "*<Function test_func_one>*")
 
     assert result.ret == 0
 
 
-def test_import_nested_module_completely_specify_member(testdir):
-    """Test importing a nested module completely and specifying a member"""
+@pytest.mark.parametrize(
+    "involving", ["one.two::func_one", "one.two"], ids=["member", "module"]
+)
+def test_import_nested_module_completely(pytester, make_project, runpytest, involving):
+    """Test importing a nested module completely and specifying either a member
+    of it or the whole module"""
     # make a nested module
-    module_dir = testdir.mkpydir("one")
-    module_file = testdir.makepyfile(
+    module_dir = pytester.mkpydir("one")
+    module_file = pytester.makepyfile(
         two="""
             def func_one():
                 return "one"
         """
     )
-    shutil.move(module_file, str(Path(module_dir) / "two.py"))
-
-    testdir.makepyfile(
-        test_one="""
-        from one import two
+    shutil.move(str(module_file), str(module_dir / "two.py"))
 
-        def test_func_one():
-            assert two.func_one() == "one"
-    """
-    )
+    make_project(test_one="import_nested_module")
 
-    result = testdir.runpytest("-v", "--involving", "one.two::func_one")
+    result = runpytest("--collect-only", "--no-header", "--involving", involving)
 
-    result.stdout.fnmatch_lines(["test_one.py::test_func_one PASSED*"])
+    assert_lines(result, "*<Function test_func_one>*")
 
     assert result.ret == 0
 
 
-def test_import_nested_module_completely_specify_module(testdir):
-    """Test importing a nested module completely and specifying the module"""
-    # make a nested module
-    module_dir = testdir.mkpydir("one")
-    module_file = testdir.makepyfile(
-        two="""
-            def func_one():
-                return "one"
-        """
-    )
-    shutil.move(module_file, str(Path(module_dir) / "two.py"))
-
-    testdir.makepyfile(
-        test_one="""
-        from one import two
-
-        def test_func_one():
-            assert two.func_one() == "one"
-    """
-    )
-
-    result = testdir.runpytest("-v", "--involving", "one.two::func_one")
-
-    result.stdout.fnmatch_lines(["test_one.py::test_func_one PASSED*"])
-
-    assert result.ret == 0
-
-
-def test_proceeds_as_normal_if_arg_not_provided(testdir):
+def test_proceeds_as_normal_if_arg_not_provided(make_project, runpytest):
     """Test that if --involving is not provided then test collection
     happens as normal"""
-    make_multiple_modules(testdir, ["one"])
-
-    testdir.makepyfile(
-        test_one="""
-        import one
-
-        def test_func_one():
-            assert one.func_one() == "one"
-    """
-    )
+    make_project(["one"], test_one="import_one")
 
-    result = testdir.runpytest("-v")
+    result = runpytest("-q", "-rA")
 
-    result.stdout.fnmatch_lines(["test_one.py::test_func_one PASSED*"])
+    assert_lines(result, "PASSED test_one.py::test_func_one")
 
     assert result.ret == 0